@@ -19,14 +19,22 @@ from typing import Optional, Tuple, Union
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.utils.checkpoint
 
-from ..utils import USE_PEFT_BACKEND
+from ..utils import USE_PEFT_BACKEND, is_torch_version
 from .activations import get_activation
 from .attention_processor import SpatialNorm
 from .lora import LoRACompatibleConv1d, LoRACompatibleConv2d, LoRACompatibleLinear
 from .normalization import AdaGroupNorm
 
 
+# the installed torch version cannot change at runtime, so the checkpoint function is selected once at import
+if is_torch_version(">=", "1.11.0"):
+    _checkpoint = partial(torch.utils.checkpoint.checkpoint, use_reentrant=False)
+else:
+    _checkpoint = torch.utils.checkpoint.checkpoint
+
+
 class Upsample1D(nn.Module):
     """A 1D upsampling layer with an optional convolution.
 
@@ -734,9 +742,29 @@ class ResnetBlock1D(nn.Module):
                 in_channels, conv_1d_out_channels, kernel_size=1, stride=1, padding=0, bias=conv_shortcut_bias
             )
 
-    def forward(self, input_tensor, temb, scale: float = 1.0):
+    def _norm_act_conv1(self, hidden_states: torch.FloatTensor, scale: float = 1.0) -> torch.FloatTensor:
+        hidden_states = self.norm1(hidden_states)
+        hidden_states = self.nonlinearity(hidden_states)
+        return self.conv1(hidden_states, scale) if not USE_PEFT_BACKEND else self.conv1(hidden_states)
+
+    def forward(self, input_tensor, temb, scale: float = 1.0, checkpoint_norm_conv: bool = False):
         hidden_states = input_tensor
 
+        if checkpoint_norm_conv:
+            # only the first normalization, activation and convolution are recomputed in the backward pass, the
+            # activations of the rest of the block are kept
+            if (
+                self.upsample is not None
+                or self.downsample is not None
+                or self.time_embedding_norm in ("ada_group", "spatial")
+            ):
+                raise ValueError(
+                    "`checkpoint_norm_conv` is only supported for blocks without resampling and with a `default` or"
+                    " `scale_shift` time embedding norm."
+                )
+            hidden_states = _checkpoint(self._norm_act_conv1, hidden_states, scale)
+            return self._forward_after_conv1(input_tensor, hidden_states, temb, scale)
+
         if self.time_embedding_norm == "ada_group" or self.time_embedding_norm == "spatial":
             hidden_states = self.norm1(hidden_states, temb)
         else:
@@ -773,6 +801,9 @@ class ResnetBlock1D(nn.Module):
 
         hidden_states = self.conv1(hidden_states, scale) if not USE_PEFT_BACKEND else self.conv1(hidden_states)
 
+        return self._forward_after_conv1(input_tensor, hidden_states, temb, scale)
+
+    def _forward_after_conv1(self, input_tensor, hidden_states, temb, scale: float = 1.0):
         if self.time_emb_proj is not None:
             if not self.skip_time_act:
                 temb = self.nonlinearity(temb)
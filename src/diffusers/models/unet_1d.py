@@ -19,10 +19,10 @@ import torch
 import torch.nn as nn
 
 from ..configuration_utils import ConfigMixin, register_to_config
-from ..utils import BaseOutput
+from ..utils import BaseOutput, is_torch_version
 from .embeddings import GaussianFourierProjection, TimestepEmbedding, Timesteps
 from .modeling_utils import ModelMixin
-from .unet_1d_blocks import get_down_block, get_mid_block, get_out_block, get_up_block
+from .unet_1d_blocks import SelfAttention1d, get_down_block, get_mid_block, get_out_block, get_up_block
 
 
 @dataclass
@@ -82,6 +82,9 @@ class UNet1DModel(ModelMixin, ConfigMixin):
             Experimental feature for using a UNet without upsampling.
         conditioning_channels (`int`, *optional*, defaults to `None`): The number of channels in the conditioning input.
         use_conditioning_embedding (`bool`, *optional*, defaults to `False`): Whether to use a conditioning embedding.
+        gelu_approximate (`str`, *optional*, defaults to `"none"`):
+            The GELU approximation used by the [`~models.unet_1d_blocks.ResConvBlock`]s of the down blocks. `"tanh"`
+            is cheaper and can be fused, but pretrained checkpoints were trained with the exact `"none"`.
     """
 
     @register_to_config
@@ -117,9 +120,11 @@ class UNet1DModel(ModelMixin, ConfigMixin):
         add_attention: bool = True,
         conditioning_channels: Optional[int] = None,
         use_conditioning_embedding: bool = False,
+        gelu_approximate: str = "none",
     ):
         super().__init__()
         self.sample_size = sample_size
+        self._mixed_precision_dtype = None
         time_embed_dim = block_out_channels[0] * 4
         embed_dim = time_embed_dim
 
@@ -199,6 +204,7 @@ class UNet1DModel(ModelMixin, ConfigMixin):
                 resnet_time_scale_shift=resnet_time_scale_shift,
                 downsample_type=downsample_type,
                 dropout=dropout,
+                gelu_approximate=gelu_approximate,
             )
             self.down_blocks.append(down_block)
             skip_channels.append(output_channel)
@@ -266,6 +272,112 @@ class UNet1DModel(ModelMixin, ConfigMixin):
             fc_dim=block_out_channels[-1] // 4,
         )
 
+    def fuse_qkv_projections(self):
+        """
+        Enables fused QKV projections. The query, key and value projection matrices of every [`SelfAttention1d`] are
+        fused into a single 1x1 convolution.
+
+        <Tip warning={true}>
+
+        This API is 🧪 experimental.
+
+        </Tip>
+        """
+        for module in self.modules():
+            if isinstance(module, SelfAttention1d):
+                module.fuse_projections(fuse=True)
+
+    def unfuse_qkv_projections(self):
+        """Disables the fused QKV projection if enabled.
+
+        <Tip warning={true}>
+
+        This API is 🧪 experimental.
+
+        </Tip>
+
+        """
+        for module in self.modules():
+            if isinstance(module, SelfAttention1d):
+                module.fused_projections = False
+
+    def quantize_attention_projections(self, dtype: torch.dtype = torch.qint8):
+        r"""
+        Quantizes the query, key, value and output projections of every [`SelfAttention1d`] to `dtype` with dynamic
+        (weight-only) quantization. The linear layers of the output block are kept in floating point.
+
+        Args:
+            dtype (`torch.dtype`, *optional*, defaults to `torch.qint8`): The dtype of the quantized weights.
+
+        <Tip warning={true}>
+
+        This API is 🧪 experimental. Quantized linear layers only run on CPU and the quantized model cannot be saved
+        with [`~ModelMixin.save_pretrained`].
+
+        </Tip>
+        """
+        for module in self.modules():
+            if isinstance(module, SelfAttention1d):
+                module.quantize_projections(dtype=dtype)
+
+    def enable_mixed_precision(self, dtype: torch.dtype = torch.bfloat16):
+        r"""
+        Casts the down, mid and up blocks to `dtype`. The input convolution, the time and conditioning embeddings and
+        the output block keep their precision, the hidden states are cast to `dtype` when entering the first down
+        block and cast back when leaving the last up block.
+
+        Args:
+            dtype (`torch.dtype`, *optional*, defaults to `torch.bfloat16`):
+                The dtype of the down, mid and up blocks. `torch.bfloat16` has the exponent range of `torch.float32`
+                and therefore needs no gradient scaling.
+        """
+        self._mixed_precision_dtype = dtype
+        for block in self._get_unet_blocks():
+            block.to(dtype)
+
+    def disable_mixed_precision(self):
+        """
+        Disables mixed precision if enabled and casts the blocks back to the dtype of the input convolution. Weights
+        that were rounded to a lower precision by [`~UNet1DModel.enable_mixed_precision`] are not restored.
+        """
+        self._mixed_precision_dtype = None
+        for block in self._get_unet_blocks():
+            block.to(self.conv_in.weight.dtype)
+
+    def _get_unet_blocks(self):
+        blocks = list(self.down_blocks) + list(self.up_blocks)
+        if self.mid_block is not None:
+            blocks.append(self.mid_block)
+        return blocks
+
+    def compile_blocks(self, mode: str = "reduce-overhead", fullgraph: bool = True, dynamic: bool = False, **kwargs):
+        r"""
+        Compiles every down, mid and up block separately with `torch.compile`. Compiling per block keeps the
+        recompilation scope small while still fusing the convolution, normalization and activation kernels of each
+        block and replaying them through CUDA graphs with `mode="reduce-overhead"`.
+
+        The blocks are compiled in place, so the state dict keys of the model are unchanged. When sampling at many
+        different shapes, consider raising `torch._dynamo.config.cache_size_limit` and enabling
+        `torch.backends.cudnn.benchmark`.
+
+        Args:
+            mode (`str`, *optional*, defaults to `"reduce-overhead"`): The `torch.compile` mode.
+            fullgraph (`bool`, *optional*, defaults to `True`): Whether to error out on graph breaks.
+            dynamic (`bool`, *optional*, defaults to `False`): Whether to trace with dynamic shapes.
+            kwargs: Additional keyword arguments passed to `torch.compile`.
+
+        <Tip warning={true}>
+
+        This API is 🧪 experimental.
+
+        </Tip>
+        """
+        if is_torch_version("<", "2.2.0"):
+            raise ImportError("`compile_blocks` requires PyTorch 2.2, to use it, please upgrade PyTorch to 2.2.")
+
+        for block in self._get_unet_blocks():
+            block.compile(mode=mode, fullgraph=fullgraph, dynamic=dynamic, **kwargs)
+
     def forward(
         self,
         sample: torch.FloatTensor,
@@ -319,22 +431,30 @@ class UNet1DModel(ModelMixin, ConfigMixin):
         # 2. pre-process
         sample = self.conv_in(sample)
 
+        sample_dtype = sample.dtype
+        block_embed = embed
+        if self._mixed_precision_dtype is not None:
+            sample = sample.to(self._mixed_precision_dtype)
+            block_embed = embed.to(self._mixed_precision_dtype)
+
         # 3. down
         down_block_res_samples = (sample,)
         for downsample_block in self.down_blocks:
-            sample, res_samples = downsample_block(hidden_states=sample, temb=embed)
+            sample, res_samples = downsample_block(hidden_states=sample, temb=block_embed)
             down_block_res_samples += res_samples
 
         # 4. mid
         if self.mid_block is not None:
-            sample = self.mid_block(sample, temb=embed)
+            sample = self.mid_block(sample, temb=block_embed)
 
         # 5. up
         for upsample_block in self.up_blocks:
             res_samples = down_block_res_samples[-len(upsample_block.resnets) :]
             down_block_res_samples = down_block_res_samples[: -len(upsample_block.resnets)]
 
-            sample = upsample_block(sample, res_hidden_states_tuple=res_samples, temb=embed)
+            sample = upsample_block(sample, res_hidden_states_tuple=res_samples, temb=block_embed)
+
+        sample = sample.to(sample_dtype)
 
         # 6. post-process
         if self.out_block is not None:
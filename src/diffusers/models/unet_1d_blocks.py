@@ -11,21 +11,88 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import math
-from typing import Any, Dict, Optional, Tuple, Union
+import functools
+import inspect
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple, Union
 
 import torch
+import torch.nn.functional as F
 from torch import nn
 
 from ..utils import is_torch_version, logging
-from ..utils.torch_utils import apply_freeu
+from ..utils.torch_utils import fourier_filter
 from .activations import get_activation
-from .resnet import Downsample1D, ResidualTemporalBlock1D, ResnetBlock1D, Upsample1D, rearrange_dims
+from .resnet import Downsample1D, ResidualTemporalBlock1D, ResnetBlock1D, Upsample1D, _checkpoint
 
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
 
+def _cat_channels(hidden_states: torch.Tensor, res_hidden_states: torch.Tensor) -> torch.Tensor:
+    """
+    Concatenates two `(batch, channels, length)` tensors along the channel dim. The skip states are cast to the dtype
+    of `hidden_states`, so skip states kept in a wider dtype do not promote the concatenation and every layer after
+    it.
+    """
+    return torch.cat([hidden_states, res_hidden_states.to(hidden_states.dtype)], dim=1)
+
+
+def _call_resnet(
+    resnet: nn.Module, hidden_states: torch.Tensor, temb: Optional[torch.Tensor], scale: float
+) -> torch.Tensor:
+    return resnet(hidden_states, temb, scale=scale)
+
+
+def _call_resnet_checkpoint_norm_conv(
+    resnet: nn.Module, hidden_states: torch.Tensor, temb: Optional[torch.Tensor], scale: float
+) -> torch.Tensor:
+    return resnet(hidden_states, temb, scale=scale, checkpoint_norm_conv=True)
+
+
+def _check_num_res_hidden_states(res_hidden_states_tuple: Tuple[torch.Tensor, ...], num_resnets: int):
+    # the resnets are zipped with the skip states consumed from the end of the tuple, too few of them would silently
+    # skip the remaining resnets
+    if len(res_hidden_states_tuple) < num_resnets:
+        raise ValueError(
+            f"Expected at least {num_resnets} residual hidden states, one per resnet, but got"
+            f" {len(res_hidden_states_tuple)}."
+        )
+
+
+def _cat_channels_freeu(
+    hidden_states: torch.Tensor,
+    res_hidden_states: torch.Tensor,
+    resolution_idx: int,
+    s1: float,
+    s2: float,
+    b1: float,
+    b2: float,
+) -> torch.Tensor:
+    """
+    [`~utils.torch_utils.apply_freeu`] followed by `_cat_channels`, the scaled backbone features are concatenated
+    directly instead of being written back, so unlike `apply_freeu`, `hidden_states` is left untouched.
+    """
+    # FreeU: Only operate on the first two stages
+    if resolution_idx == 0:
+        backbone_scale, skip_scale = b1, s1
+    elif resolution_idx == 1:
+        backbone_scale, skip_scale = b2, s2
+    else:
+        return _cat_channels(hidden_states, res_hidden_states)
+
+    num_half_channels = hidden_states.shape[1] // 2
+    # the filter works on (batch, channels, height, width), a sequence is filtered as a single row
+    res_hidden_states = fourier_filter(res_hidden_states.unsqueeze(2), threshold=1, scale=skip_scale).squeeze(2)
+    return torch.cat(
+        [
+            hidden_states[:, :num_half_channels] * backbone_scale,
+            hidden_states[:, num_half_channels:],
+            res_hidden_states.to(hidden_states.dtype),
+        ],
+        dim=1,
+    )
+
+
 class DownResnetBlock1D(nn.Module):
     def __init__(
         self,
@@ -61,29 +128,19 @@ class DownResnetBlock1D(nn.Module):
 
         self.resnets = nn.ModuleList(resnets)
 
-        if non_linearity is None:
-            self.nonlinearity = None
-        else:
-            self.nonlinearity = get_activation(non_linearity)
+        # absent layers are identities so that forward stays free of `Optional[nn.Module]` branches
+        self.nonlinearity = nn.Identity() if non_linearity is None else get_activation(non_linearity)
 
-        self.downsample = None
-        if add_downsample:
-            self.downsample = Downsample1D(out_channels, use_conv=True, padding=1)
+        self.downsample = Downsample1D(out_channels, use_conv=True, padding=1) if add_downsample else nn.Identity()
 
     def forward(self, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor] = None) -> torch.FloatTensor:
-        output_states = ()
-
-        hidden_states = self.resnets[0](hidden_states, temb)
-        for resnet in self.resnets[1:]:
+        for resnet in self.resnets:
             hidden_states = resnet(hidden_states, temb)
 
-        output_states += (hidden_states,)
-
-        if self.nonlinearity is not None:
-            hidden_states = self.nonlinearity(hidden_states)
+        output_states = (hidden_states,)
 
-        if self.downsample is not None:
-            hidden_states = self.downsample(hidden_states)
+        hidden_states = self.nonlinearity(hidden_states)
+        hidden_states = self.downsample(hidden_states)
 
         return hidden_states, output_states
 
@@ -121,14 +178,9 @@ class UpResnetBlock1D(nn.Module):
 
         self.resnets = nn.ModuleList(resnets)
 
-        if non_linearity is None:
-            self.nonlinearity = None
-        else:
-            self.nonlinearity = get_activation(non_linearity)
+        self.nonlinearity = nn.Identity() if non_linearity is None else get_activation(non_linearity)
 
-        self.upsample = None
-        if add_upsample:
-            self.upsample = Upsample1D(out_channels, use_conv_transpose=True)
+        self.upsample = Upsample1D(out_channels, use_conv_transpose=True) if add_upsample else nn.Identity()
 
     def forward(
         self,
@@ -138,17 +190,13 @@ class UpResnetBlock1D(nn.Module):
     ) -> torch.FloatTensor:
         if res_hidden_states_tuple is not None:
             res_hidden_states = res_hidden_states_tuple[-1]
-            hidden_states = torch.cat((hidden_states, res_hidden_states), dim=1)
+            hidden_states = _cat_channels(hidden_states, res_hidden_states)
 
-        hidden_states = self.resnets[0](hidden_states, temb)
-        for resnet in self.resnets[1:]:
+        for resnet in self.resnets:
             hidden_states = resnet(hidden_states, temb)
 
-        if self.nonlinearity is not None:
-            hidden_states = self.nonlinearity(hidden_states)
-
-        if self.upsample is not None:
-            hidden_states = self.upsample(hidden_states)
+        hidden_states = self.nonlinearity(hidden_states)
+        hidden_states = self.upsample(hidden_states)
 
         return hidden_states
 
@@ -188,6 +236,10 @@ class MidResTemporalBlock1D(nn.Module):
         self.in_channels = in_channels
         self.out_channels = out_channels
         self.add_downsample = add_downsample
+        self.add_upsample = add_upsample
+
+        if add_upsample and add_downsample:
+            raise ValueError("Block cannot downsample and upsample")
 
         # there will always be at least one resnet
         resnets = [ResidualTemporalBlock1D(in_channels, out_channels, embed_dim=embed_dim)]
@@ -197,31 +249,17 @@ class MidResTemporalBlock1D(nn.Module):
 
         self.resnets = nn.ModuleList(resnets)
 
-        if non_linearity is None:
-            self.nonlinearity = None
-        else:
-            self.nonlinearity = get_activation(non_linearity)
+        self.nonlinearity = nn.Identity() if non_linearity is None else get_activation(non_linearity)
 
-        self.upsample = None
-        if add_upsample:
-            self.upsample = Downsample1D(out_channels, use_conv=True)
-
-        self.downsample = None
-        if add_downsample:
-            self.downsample = Downsample1D(out_channels, use_conv=True)
-
-        if self.upsample and self.downsample:
-            raise ValueError("Block cannot downsample and upsample")
+        self.upsample = Downsample1D(out_channels, use_conv=True) if add_upsample else nn.Identity()
+        self.downsample = Downsample1D(out_channels, use_conv=True) if add_downsample else nn.Identity()
 
     def forward(self, hidden_states: torch.FloatTensor, temb: torch.FloatTensor) -> torch.FloatTensor:
-        hidden_states = self.resnets[0](hidden_states, temb)
-        for resnet in self.resnets[1:]:
+        for resnet in self.resnets:
             hidden_states = resnet(hidden_states, temb)
 
-        if self.upsample:
-            hidden_states = self.upsample(hidden_states)
-        if self.downsample:
-            self.downsample = self.downsample(hidden_states)
+        hidden_states = self.upsample(hidden_states)
+        hidden_states = self.downsample(hidden_states)
 
         return hidden_states
 
@@ -236,9 +274,7 @@ class OutConv1DBlock(nn.Module):
 
     def forward(self, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor] = None) -> torch.FloatTensor:
         hidden_states = self.final_conv1d_1(hidden_states)
-        hidden_states = rearrange_dims(hidden_states)
         hidden_states = self.final_conv1d_gn(hidden_states)
-        hidden_states = rearrange_dims(hidden_states)
         hidden_states = self.final_conv1d_act(hidden_states)
         hidden_states = self.final_conv1d_2(hidden_states)
         return hidden_states
@@ -247,40 +283,40 @@ class OutConv1DBlock(nn.Module):
 class OutValueFunctionBlock(nn.Module):
     def __init__(self, fc_dim: int, embed_dim: int, act_fn: str = "mish"):
         super().__init__()
-        self.final_block = nn.ModuleList(
-            [
-                nn.Linear(fc_dim + embed_dim, fc_dim // 2),
-                get_activation(act_fn),
-                nn.Linear(fc_dim // 2, 1),
-            ]
+        self.final_block = nn.Sequential(
+            nn.Linear(fc_dim + embed_dim, fc_dim // 2),
+            get_activation(act_fn),
+            nn.Linear(fc_dim // 2, 1),
         )
 
     def forward(self, hidden_states: torch.FloatTensor, temb: torch.FloatTensor) -> torch.FloatTensor:
         hidden_states = hidden_states.view(hidden_states.shape[0], -1)
         hidden_states = torch.cat((hidden_states, temb), dim=-1)
-        for layer in self.final_block:
-            hidden_states = layer(hidden_states)
-
-        return hidden_states
+        return self.final_block(hidden_states)
 
 
+# resampling kernels are converted to contiguous fp32 tensors once at import, consumers should register a clone
+# of the entry as a non-persistent buffer so that it follows the module across `.to()` calls
 _kernels = {
-    "linear": [1 / 8, 3 / 8, 3 / 8, 1 / 8],
-    "cubic": [-0.01171875, -0.03515625, 0.11328125, 0.43359375, 0.43359375, 0.11328125, -0.03515625, -0.01171875],
-    "lanczos3": [
-        0.003689131001010537,
-        0.015056144446134567,
-        -0.03399861603975296,
-        -0.066637322306633,
-        0.13550527393817902,
-        0.44638532400131226,
-        0.44638532400131226,
-        0.13550527393817902,
-        -0.066637322306633,
-        -0.03399861603975296,
-        0.015056144446134567,
-        0.003689131001010537,
-    ],
+    name: torch.tensor(kernel, dtype=torch.float32)
+    for name, kernel in {
+        "linear": [1 / 8, 3 / 8, 3 / 8, 1 / 8],
+        "cubic": [-0.01171875, -0.03515625, 0.11328125, 0.43359375, 0.43359375, 0.11328125, -0.03515625, -0.01171875],
+        "lanczos3": [
+            0.003689131001010537,
+            0.015056144446134567,
+            -0.03399861603975296,
+            -0.066637322306633,
+            0.13550527393817902,
+            0.44638532400131226,
+            0.44638532400131226,
+            0.13550527393817902,
+            -0.066637322306633,
+            -0.03399861603975296,
+            0.015056144446134567,
+            0.003689131001010537,
+        ],
+    }.items()
 }
 
 
@@ -290,6 +326,8 @@ class SelfAttention1d(nn.Module):
         self.channels = in_channels
         self.group_norm = nn.GroupNorm(1, num_channels=in_channels)
         self.num_heads = n_head
+        self.head_dim = in_channels // n_head
+        self.scale = self.head_dim**-0.5
 
         self.query = nn.Linear(self.channels, self.channels)
         self.key = nn.Linear(self.channels, self.channels)
@@ -297,53 +335,116 @@ class SelfAttention1d(nn.Module):
 
         self.proj_attn = nn.Linear(self.channels, self.channels, bias=True)
 
-        self.dropout = nn.Dropout(dropout_rate, inplace=True)
+        self.dropout = nn.Dropout(dropout_rate)
+        self.fused_projections = False
+
+    @torch.no_grad()
+    def fuse_projections(self, fuse: bool = True):
+        if not all(isinstance(linear, nn.Linear) for linear in (self.query, self.key, self.value)):
+            raise ValueError(
+                "The query, key and value projections cannot be fused after they were replaced by"
+                " `quantize_projections`, fuse them before quantizing instead."
+            )
+
+        device = self.query.weight.data.device
+        dtype = self.query.weight.data.dtype
+
+        # fetch weight matrices.
+        concatenated_weights = torch.cat([self.query.weight.data, self.key.weight.data, self.value.weight.data])
+        concatenated_bias = torch.cat([self.query.bias.data, self.key.bias.data, self.value.bias.data])
+
+        # a single 1x1 conv runs on (B, C, T) directly, so no transpose is needed before the projection
+        self.qkv = nn.Conv1d(self.channels, 3 * self.channels, kernel_size=1, device=device, dtype=dtype)
+        self.qkv.weight.copy_(concatenated_weights[:, :, None])
+        self.qkv.bias.copy_(concatenated_bias)
+
+        self.fused_projections = fuse
+
+    def quantize_projections(self, dtype: torch.dtype = torch.qint8):
+        r"""
+        Replaces the query, key, value and output projections with dynamically quantized linear layers. The weights
+        are quantized once while the activations are quantized on the fly, which halves the weight bandwidth of the
+        projections. Quantized linear layers only run on CPU.
+
+        Args:
+            dtype (`torch.dtype`, *optional*, defaults to `torch.qint8`): The dtype of the quantized weights.
+        """
+        # the fused projection is a convolution and would bypass the quantized linear layers
+        self.fused_projections = False
+        torch.ao.quantization.quantize_dynamic(self, {nn.Linear}, dtype=dtype, inplace=True)
 
     def transpose_for_scores(self, projection: torch.Tensor) -> torch.Tensor:
-        new_projection_shape = projection.size()[:-1] + (self.num_heads, -1)
-        # move heads to 2nd position (B, T, H * D) -> (B, T, H, D) -> (B, H, T, D)
-        new_projection = projection.view(new_projection_shape).permute(0, 2, 1, 3)
+        batch, _, seq = projection.shape
+        # move heads to 2nd position (B, H * D, T) -> (B, H, D, T) -> (B, H, T, D)
+        new_projection = projection.view(batch, self.num_heads, self.head_dim, seq).transpose(-1, -2)
         return new_projection
 
+    def project_channels(self, linear: nn.Module, hidden_states: torch.Tensor) -> torch.Tensor:
+        # a plain float linear layer is applied as a 1x1 conv so that the projection runs on the (B, C, T) layout
+        # directly instead of on a transposed view, which would be copied to a contiguous (B, T, C) tensor first.
+        # subclasses such as `LoRACompatibleLinear` override `forward` and are called as modules instead
+        if type(linear) is nn.Linear:
+            return F.conv1d(hidden_states, linear.weight[:, :, None], linear.bias)
+        return linear(hidden_states.transpose(1, 2)).transpose(1, 2).contiguous()
+
     def forward(self, hidden_states: torch.FloatTensor) -> torch.FloatTensor:
         residual = hidden_states
         batch, channel_dim, seq = hidden_states.shape
 
         hidden_states = self.group_norm(hidden_states)
-        hidden_states = hidden_states.transpose(1, 2)
 
-        query_proj = self.query(hidden_states)
-        key_proj = self.key(hidden_states)
-        value_proj = self.value(hidden_states)
+        if self.fused_projections:
+            query_proj, key_proj, value_proj = self.qkv(hidden_states).chunk(3, dim=1)
+        else:
+            query_proj = self.project_channels(self.query, hidden_states)
+            key_proj = self.project_channels(self.key, hidden_states)
+            value_proj = self.project_channels(self.value, hidden_states)
 
         query_states = self.transpose_for_scores(query_proj)
         key_states = self.transpose_for_scores(key_proj)
         value_states = self.transpose_for_scores(value_proj)
 
-        scale = 1 / math.sqrt(math.sqrt(key_states.shape[-1]))
-
-        attention_scores = torch.matmul(query_states * scale, key_states.transpose(-1, -2) * scale)
-        attention_probs = torch.softmax(attention_scores, dim=-1)
+        if hasattr(F, "scaled_dot_product_attention"):
+            # dispatches to the fused flash / memory efficient kernels, the (B, H, T, T) scores are never materialized
+            hidden_states = F.scaled_dot_product_attention(
+                query_states,
+                key_states,
+                value_states,
+                dropout_p=self.dropout.p if self.training else 0.0,
+                is_causal=False,
+            )
+        else:
+            attention_scores = torch.matmul(query_states * self.scale, key_states.transpose(-1, -2))
+            attention_probs = torch.softmax(attention_scores, dim=-1)
+            attention_probs = self.dropout(attention_probs)
 
-        # compute attention output
-        hidden_states = torch.matmul(attention_probs, value_states)
+            # compute attention output
+            hidden_states = torch.matmul(attention_probs, value_states)
 
-        hidden_states = hidden_states.permute(0, 2, 1, 3).contiguous()
-        new_hidden_states_shape = hidden_states.size()[:-2] + (self.channels,)
-        hidden_states = hidden_states.view(new_hidden_states_shape)
+        # (B, H, T, D) -> (B, H, D, T) -> (B, C, T)
+        hidden_states = hidden_states.transpose(-1, -2).reshape(batch, channel_dim, seq)
 
         # compute next hidden_states
-        hidden_states = self.proj_attn(hidden_states)
-        hidden_states = hidden_states.transpose(1, 2)
-        hidden_states = self.dropout(hidden_states)
+        hidden_states = self.project_channels(self.proj_attn, hidden_states)
 
-        output = hidden_states + residual
+        if hidden_states.dtype != residual.dtype:
+            # under autocast the projection output is in reduced precision, adding out of place promotes it to the
+            # dtype of the residual instead of rounding the residual stream down
+            return hidden_states + residual
 
-        return output
+        # the projection output is a fresh contiguous (B, C, T) tensor, so the residual can be added in place
+        return hidden_states.add_(residual)
 
 
 class ResConvBlock(nn.Module):
-    def __init__(self, in_channels: int, mid_channels: int, out_channels: int, is_last: bool = False):
+    def __init__(
+        self,
+        in_channels: int,
+        mid_channels: int,
+        out_channels: int,
+        is_last: bool = False,
+        gelu_approximate: str = "none",
+    ):
         super().__init__()
         self.is_last = is_last
         self.has_conv_skip = in_channels != out_channels
@@ -353,12 +454,12 @@ class ResConvBlock(nn.Module):
 
         self.conv_1 = nn.Conv1d(in_channels, mid_channels, 5, padding=2)
         self.group_norm_1 = nn.GroupNorm(1, mid_channels)
-        self.gelu_1 = nn.GELU()
+        self.gelu_1 = nn.GELU(approximate=gelu_approximate)
         self.conv_2 = nn.Conv1d(mid_channels, out_channels, 5, padding=2)
 
         if not self.is_last:
             self.group_norm_2 = nn.GroupNorm(1, out_channels)
-            self.gelu_2 = nn.GELU()
+            self.gelu_2 = nn.GELU(approximate=gelu_approximate)
 
     def forward(self, hidden_states: torch.FloatTensor) -> torch.FloatTensor:
         residual = self.conv_skip(hidden_states) if self.has_conv_skip else hidden_states
@@ -430,7 +531,7 @@ class UNetMidBlock1D(nn.Module):
                     SelfAttention1d(in_channels, n_head=in_channels // attention_head_dim, dropout_rate=dropout)
                 )
             else:
-                attentions.append(None)
+                attentions.append(nn.Identity())
 
             resnets.append(
                 ResnetBlock1D(
@@ -453,8 +554,7 @@ class UNetMidBlock1D(nn.Module):
     def forward(self, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor] = None) -> torch.FloatTensor:
         hidden_states = self.resnets[0](hidden_states, temb)
         for attn, resnet in zip(self.attentions, self.resnets[1:]):
-            if attn is not None:
-                hidden_states = attn(hidden_states)  # add temb when attention supports it
+            hidden_states = attn(hidden_states)  # add temb when attention supports it
             hidden_states = resnet(hidden_states, temb)
 
         return hidden_states
@@ -558,14 +658,15 @@ class AttnDownBlock1D(nn.Module):
         cross_attention_kwargs = cross_attention_kwargs if cross_attention_kwargs is not None else {}
 
         lora_scale = cross_attention_kwargs.get("scale", 1.0)
+        # built once outside of the loop, this also leaves the caller's dict untouched
+        attn_kwargs = {**cross_attention_kwargs, "scale": lora_scale}
 
-        output_states = ()
+        output_states = []
 
         for resnet, attn in zip(self.resnets, self.attentions):
-            cross_attention_kwargs.update({"scale": lora_scale})
             hidden_states = resnet(hidden_states, temb, scale=lora_scale)
-            hidden_states = attn(hidden_states, **cross_attention_kwargs)
-            output_states = output_states + (hidden_states,)
+            hidden_states = attn(hidden_states, **attn_kwargs)
+            output_states.append(hidden_states)
 
         if self.downsamplers is not None:
             for downsampler in self.downsamplers:
@@ -574,9 +675,9 @@ class AttnDownBlock1D(nn.Module):
                 else:
                     hidden_states = downsampler(hidden_states, scale=lora_scale)
 
-            output_states += (hidden_states,)
+            output_states.append(hidden_states)
 
-        return hidden_states, output_states
+        return hidden_states, tuple(output_states)
 
 
 class DownBlock1D(nn.Module):
@@ -633,56 +734,49 @@ class DownBlock1D(nn.Module):
             self.downsamplers = None
 
         self.gradient_checkpointing = False
+        self._checkpoint_fn = _checkpoint
 
     def forward(
         self, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor] = None, scale: float = 1.0
     ) -> Tuple[torch.FloatTensor, Tuple[torch.FloatTensor, ...]]:
-        output_states = ()
+        output_states = []
 
         for resnet in self.resnets:
             if self.training and self.gradient_checkpointing:
-
-                def create_custom_forward(module):
-                    def custom_forward(*inputs):
-                        return module(*inputs)
-
-                    return custom_forward
-
-                if is_torch_version(">=", "1.11.0"):
-                    hidden_states = torch.utils.checkpoint.checkpoint(
-                        create_custom_forward(resnet), hidden_states, temb, use_reentrant=False
-                    )
-                else:
-                    hidden_states = torch.utils.checkpoint.checkpoint(
-                        create_custom_forward(resnet), hidden_states, temb
-                    )
+                hidden_states = self._checkpoint_fn(resnet, hidden_states, temb)
             else:
                 hidden_states = resnet(hidden_states, temb, scale=scale)
 
-            output_states = output_states + (hidden_states,)
+            output_states.append(hidden_states)
 
         if self.downsamplers is not None:
             for downsampler in self.downsamplers:
                 hidden_states = downsampler(hidden_states, scale=scale)
 
-        return hidden_states, output_states
+        return hidden_states, tuple(output_states)
 
 
 class DownBlock1DNoSkip(nn.Module):
-    def __init__(self, out_channels: int, in_channels: int, mid_channels: Optional[int] = None):
+    def __init__(
+        self,
+        out_channels: int,
+        in_channels: int,
+        mid_channels: Optional[int] = None,
+        gelu_approximate: str = "none",
+    ):
         super().__init__()
         mid_channels = out_channels if mid_channels is None else mid_channels
 
         resnets = [
-            ResConvBlock(in_channels, mid_channels, mid_channels),
-            ResConvBlock(mid_channels, mid_channels, mid_channels),
-            ResConvBlock(mid_channels, mid_channels, out_channels),
+            ResConvBlock(in_channels, mid_channels, mid_channels, gelu_approximate=gelu_approximate),
+            ResConvBlock(mid_channels, mid_channels, mid_channels, gelu_approximate=gelu_approximate),
+            ResConvBlock(mid_channels, mid_channels, out_channels, gelu_approximate=gelu_approximate),
         ]
 
         self.resnets = nn.ModuleList(resnets)
 
     def forward(self, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor] = None) -> torch.FloatTensor:
-        hidden_states = torch.cat([hidden_states, temb], dim=1)
+        hidden_states = _cat_channels(hidden_states, temb)
         for resnet in self.resnets:
             hidden_states = resnet(hidden_states)
 
@@ -781,11 +875,10 @@ class AttnUpBlock1D(nn.Module):
         upsample_size: Optional[int] = None,
         scale: float = 1.0,
     ) -> torch.FloatTensor:
-        for resnet, attn in zip(self.resnets, self.attentions):
-            # pop res hidden states
-            res_hidden_states = res_hidden_states_tuple[-1]
-            res_hidden_states_tuple = res_hidden_states_tuple[:-1]
-            hidden_states = torch.cat([hidden_states, res_hidden_states], dim=1)
+        _check_num_res_hidden_states(res_hidden_states_tuple, len(self.resnets))
+
+        for resnet, attn, res_hidden_states in zip(self.resnets, self.attentions, reversed(res_hidden_states_tuple)):
+            hidden_states = _cat_channels(hidden_states, res_hidden_states)
 
             hidden_states = resnet(hidden_states, temb, scale=scale)
             cross_attention_kwargs = {"scale": scale}
@@ -849,60 +942,241 @@ class UpBlock1D(nn.Module):
             self.upsamplers = None
 
         self.gradient_checkpointing = False
+        self._checkpoint_fn = _checkpoint
+        # "block" checkpoints every resnet as a whole, "norm_conv" only its first normalization, activation and conv
+        self.checkpoint_granularity = "block"
         self.resolution_idx = resolution_idx
+        # FreeU only operates on the first two stages, the other blocks never need to look up its factors
+        self._freeu_possible = resolution_idx is not None and resolution_idx < 2
+        self._compile_resnets_kwargs = None
+        self._compiled_run_resnets = None
+        self._cuda_graphs_enabled = False
+        self._cuda_graph_state = None
+
+    def _checkpoint_resnet(
+        self, resnet: nn.Module, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor], scale: float
+    ) -> torch.FloatTensor:
+        return self._checkpoint_fn(resnet, hidden_states, temb)
+
+    def _get_resnet_forward(self) -> Callable:
+        # the checkpointing mode is resolved once per forward, the returned callable runs a single resnet
+        if not (self.training and self.gradient_checkpointing):
+            return _call_resnet
+        if self.checkpoint_granularity == "norm_conv":
+            return _call_resnet_checkpoint_norm_conv
+        if self.checkpoint_granularity == "block":
+            return self._checkpoint_resnet
+        raise ValueError(
+            f"Unknown `checkpoint_granularity`: {self.checkpoint_granularity}, expected `block` or `norm_conv`."
+        )
 
-    def forward(
+    def _get_concat_fn(self) -> Callable:
+        # s1, s2, b1 and b2 are set together when FreeU is enabled and reset to None when it is disabled
+        if not (self._freeu_possible and getattr(self, "b1", None) is not None):
+            return _cat_channels
+        return functools.partial(
+            _cat_channels_freeu, resolution_idx=self.resolution_idx, s1=self.s1, s2=self.s2, b1=self.b1, b2=self.b2
+        )
+
+    def _run_resnets(
         self,
         hidden_states: torch.FloatTensor,
         res_hidden_states_tuple: Tuple[torch.FloatTensor, ...],
-        temb: Optional[torch.FloatTensor] = None,
-        upsample_size: Optional[int] = None,
-        scale: float = 1.0,
-    ):
-        is_freeu_enabled = (
-            getattr(self, "s1", None)
-            and getattr(self, "s2", None)
-            and getattr(self, "b1", None)
-            and getattr(self, "b2", None)
+        temb: Optional[torch.FloatTensor],
+        scale: float,
+        concat_fn: Callable = _cat_channels,
+    ) -> torch.FloatTensor:
+        resnet_forward = self._get_resnet_forward()
+        for resnet, res_hidden_states in zip(self.resnets, reversed(res_hidden_states_tuple)):
+            hidden_states = resnet_forward(resnet, concat_fn(hidden_states, res_hidden_states), temb, scale)
+
+        return hidden_states
+
+    def compile_resnets(self, mode: str = "reduce-overhead", dynamic: bool = True, **kwargs):
+        r"""
+        Compiles the skip concatenation and resnet loop of the block with `torch.compile`, so that the concatenations
+        and the normalization, activation and convolution kernels of the resnets can be fused. The loop is traced with
+        dynamic shapes by default, so a single graph serves every sample length. The compiled loop is not used while
+        gradient checkpointing is active or while FreeU is enabled.
+
+        Args:
+            mode (`str`, *optional*, defaults to `"reduce-overhead"`): The `torch.compile` mode.
+            dynamic (`bool`, *optional*, defaults to `True`): Whether to trace with dynamic shapes.
+            kwargs: Additional keyword arguments passed to `torch.compile`.
+
+        <Tip warning={true}>
+
+        This API is 🧪 experimental.
+
+        </Tip>
+        """
+        if is_torch_version("<", "2.0.0"):
+            raise ImportError("`compile_resnets` requires PyTorch 2.0, to use it, please upgrade PyTorch to 2.0.")
+        if self._cuda_graphs_enabled:
+            raise ValueError(
+                "`compile_resnets` cannot be combined with `enable_cuda_graphs`, call `disable_cuda_graphs` first."
+            )
+
+        self._compile_resnets_kwargs = {"mode": mode, "dynamic": dynamic, **kwargs}
+        self._compiled_run_resnets = self._compile_run_resnets()
+
+    def _compile_run_resnets(self) -> Callable:
+        # the unbound function is compiled and called with the block as its first argument, a compiled bound method
+        # would keep calling the original block from a `copy.deepcopy` of it
+        return torch.compile(type(self)._run_resnets, **self._compile_resnets_kwargs)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # compiled functions and captured CUDA graphs cannot be pickled, the resnet loop is compiled again when the
+        # block is unpickled and the graph is captured again on the next call
+        state = self.__dict__.copy()
+        state["_compiled_run_resnets"] = None
+        state["_cuda_graph_state"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        super().__setstate__(state)
+        if self._compile_resnets_kwargs is not None:
+            self._compiled_run_resnets = self._compile_run_resnets()
+
+    def enable_cuda_graphs(self):
+        r"""
+        Enables replaying the block through a CUDA graph during inference. On the first call with a given input shape,
+        the forward pass is warmed up and captured into a CUDA graph, later calls with the same shapes copy their
+        inputs into the captured buffers and replay all of the block's kernels with a single launch. The graph is
+        captured again whenever the input shapes, dtypes, `upsample_size`, `scale` or the FreeU factors change, or when
+        the block is moved or cast, e.g. by moving the model to the CPU and back.
+
+        The graph is only used for CUDA inputs in eval mode with gradients disabled, e.g. under `torch.no_grad()`. It
+        cannot be combined with [`~UpBlock1D.compile_resnets`].
+
+        <Tip warning={true}>
+
+        This API is 🧪 experimental.
+
+        </Tip>
+        """
+        # a compiled loop, e.g. with `mode="reduce-overhead"`, manages its own CUDA graphs and cannot be captured into
+        # an outer one
+        if self._compiled_run_resnets is not None:
+            raise ValueError("`enable_cuda_graphs` cannot be combined with `compile_resnets`.")
+
+        self._cuda_graphs_enabled = True
+
+    def _apply(self, *args, **kwargs):
+        # the graph reads the weights from the addresses they had at capture time, `.to()`, `.cpu()` or `.half()`,
+        # e.g. from model CPU offloading, reallocate them, so the graph is captured again on the next call
+        self._cuda_graph_state = None
+        return super()._apply(*args, **kwargs)
+
+    def disable_cuda_graphs(self):
+        r"""
+        Disables CUDA graph replay if it was enabled and releases the captured graph.
+        """
+        self._cuda_graphs_enabled = False
+        self._cuda_graph_state = None
+
+    def _cuda_graph_forward(
+        self,
+        hidden_states: torch.FloatTensor,
+        res_hidden_states_tuple: Tuple[torch.FloatTensor, ...],
+        temb: Optional[torch.FloatTensor],
+        upsample_size: Optional[int],
+        scale: float,
+    ) -> torch.FloatTensor:
+        inputs = (hidden_states, *res_hidden_states_tuple) + ((temb,) if temb is not None else ())
+        freeu_factors = tuple(getattr(self, name, None) for name in ("s1", "s2", "b1", "b2"))
+        key = (
+            tuple((tensor.shape, tensor.dtype, tensor.device) for tensor in inputs),
+            temb is not None,
+            upsample_size,
+            scale,
+            freeu_factors,
         )
 
-        for resnet in self.resnets:
-            # pop res hidden states
-            res_hidden_states = res_hidden_states_tuple[-1]
-            res_hidden_states_tuple = res_hidden_states_tuple[:-1]
-
-            # FreeU: Only operate on the first two stages
-            if is_freeu_enabled:
-                hidden_states, res_hidden_states = apply_freeu(
-                    self.resolution_idx,
-                    hidden_states,
-                    res_hidden_states,
-                    s1=self.s1,
-                    s2=self.s2,
-                    b1=self.b1,
-                    b2=self.b2,
+        if self._cuda_graph_state is None or self._cuda_graph_state["key"] != key:
+            # drop the previous graph before capturing a new one so that its memory pool can be reused
+            self._cuda_graph_state = None
+            static_inputs = tuple(tensor.clone() for tensor in inputs)
+            num_res_hidden_states = len(res_hidden_states_tuple)
+
+            def run():
+                static_temb = static_inputs[num_res_hidden_states + 1] if temb is not None else None
+                return self._forward(
+                    static_inputs[0],
+                    static_inputs[1 : num_res_hidden_states + 1],
+                    static_temb,
+                    upsample_size,
+                    scale,
                 )
 
-            hidden_states = torch.cat([hidden_states, res_hidden_states], dim=1)
+            # streams are created on the current device, which is not necessarily the one holding the inputs
+            with torch.cuda.device(hidden_states.device):
+                # warm up on a side stream before capturing, as required by `torch.cuda.graph`
+                stream = torch.cuda.Stream()
+                stream.wait_stream(torch.cuda.current_stream())
+                with torch.cuda.stream(stream):
+                    for _ in range(3):
+                        run()
+                torch.cuda.current_stream().wait_stream(stream)
+
+                graph = torch.cuda.CUDAGraph()
+                with torch.cuda.graph(graph):
+                    static_output = run()
+
+            self._cuda_graph_state = {
+                "key": key,
+                "graph": graph,
+                "static_inputs": static_inputs,
+                "static_output": static_output,
+            }
+        else:
+            for static_input, tensor in zip(self._cuda_graph_state["static_inputs"], inputs):
+                static_input.copy_(tensor)
 
-            if self.training and self.gradient_checkpointing:
+        with torch.cuda.device(hidden_states.device):
+            self._cuda_graph_state["graph"].replay()
+        # the captured output buffer is overwritten by the next replay
+        return self._cuda_graph_state["static_output"].clone()
 
-                def create_custom_forward(module):
-                    def custom_forward(*inputs):
-                        return module(*inputs)
+    def forward(
+        self,
+        hidden_states: torch.FloatTensor,
+        res_hidden_states_tuple: Tuple[torch.FloatTensor, ...],
+        temb: Optional[torch.FloatTensor] = None,
+        upsample_size: Optional[int] = None,
+        scale: float = 1.0,
+    ):
+        _check_num_res_hidden_states(res_hidden_states_tuple, len(self.resnets))
 
-                    return custom_forward
+        if (
+            self._cuda_graphs_enabled
+            and hidden_states.is_cuda
+            and not self.training
+            and not self.gradient_checkpointing
+            and not torch.is_grad_enabled()
+        ):
+            return self._cuda_graph_forward(hidden_states, res_hidden_states_tuple, temb, upsample_size, scale)
 
-                if is_torch_version(">=", "1.11.0"):
-                    hidden_states = torch.utils.checkpoint.checkpoint(
-                        create_custom_forward(resnet), hidden_states, temb, use_reentrant=False
-                    )
-                else:
-                    hidden_states = torch.utils.checkpoint.checkpoint(
-                        create_custom_forward(resnet), hidden_states, temb
-                    )
-            else:
-                hidden_states = resnet(hidden_states, temb, scale=scale)
+        return self._forward(hidden_states, res_hidden_states_tuple, temb, upsample_size, scale)
+
+    def _forward(
+        self,
+        hidden_states: torch.FloatTensor,
+        res_hidden_states_tuple: Tuple[torch.FloatTensor, ...],
+        temb: Optional[torch.FloatTensor],
+        upsample_size: Optional[int],
+        scale: float,
+    ) -> torch.FloatTensor:
+        concat_fn = self._get_concat_fn()
+
+        if (
+            concat_fn is _cat_channels
+            and self._compiled_run_resnets is not None
+            and not (self.training and self.gradient_checkpointing)
+        ):
+            hidden_states = self._compiled_run_resnets(self, hidden_states, res_hidden_states_tuple, temb, scale)
+        else:
+            hidden_states = self._run_resnets(hidden_states, res_hidden_states_tuple, temb, scale, concat_fn)
 
         if self.upsamplers is not None:
             for upsampler in self.upsamplers:
@@ -949,53 +1223,58 @@ class UpBlock1DNoSkip(nn.Module):
         self.resnets = nn.ModuleList(resnets)
 
         self.gradient_checkpointing = False
+        self._checkpoint_fn = _checkpoint
+        self.checkpoint_granularity = "block"
         self.resolution_idx = resolution_idx
+        self._freeu_possible = resolution_idx is not None and resolution_idx < 2
 
-    def forward(self, hidden_states, res_hidden_states_tuple, temb=None, upsample_size=None, scale: float = 1.0):
-        is_freeu_enabled = (
-            getattr(self, "s1", None)
-            and getattr(self, "s2", None)
-            and getattr(self, "b1", None)
-            and getattr(self, "b2", None)
+    # Copied from diffusers.models.unet_1d_blocks.UpBlock1D._checkpoint_resnet
+    def _checkpoint_resnet(
+        self, resnet: nn.Module, hidden_states: torch.FloatTensor, temb: Optional[torch.FloatTensor], scale: float
+    ) -> torch.FloatTensor:
+        return self._checkpoint_fn(resnet, hidden_states, temb)
+
+    # Copied from diffusers.models.unet_1d_blocks.UpBlock1D._get_resnet_forward
+    def _get_resnet_forward(self) -> Callable:
+        # the checkpointing mode is resolved once per forward, the returned callable runs a single resnet
+        if not (self.training and self.gradient_checkpointing):
+            return _call_resnet
+        if self.checkpoint_granularity == "norm_conv":
+            return _call_resnet_checkpoint_norm_conv
+        if self.checkpoint_granularity == "block":
+            return self._checkpoint_resnet
+        raise ValueError(
+            f"Unknown `checkpoint_granularity`: {self.checkpoint_granularity}, expected `block` or `norm_conv`."
         )
 
-        for resnet in self.resnets:
-            # pop res hidden states
-            res_hidden_states = res_hidden_states_tuple[-1]
-            res_hidden_states_tuple = res_hidden_states_tuple[:-1]
-
-            # FreeU: Only operate on the first two stages
-            if is_freeu_enabled:
-                hidden_states, res_hidden_states = apply_freeu(
-                    self.resolution_idx,
-                    hidden_states,
-                    res_hidden_states,
-                    s1=self.s1,
-                    s2=self.s2,
-                    b1=self.b1,
-                    b2=self.b2,
-                )
-
-            hidden_states = torch.cat([hidden_states, res_hidden_states], dim=1)
+    # Copied from diffusers.models.unet_1d_blocks.UpBlock1D._get_concat_fn
+    def _get_concat_fn(self) -> Callable:
+        # s1, s2, b1 and b2 are set together when FreeU is enabled and reset to None when it is disabled
+        if not (self._freeu_possible and getattr(self, "b1", None) is not None):
+            return _cat_channels
+        return functools.partial(
+            _cat_channels_freeu, resolution_idx=self.resolution_idx, s1=self.s1, s2=self.s2, b1=self.b1, b2=self.b2
+        )
 
-            if self.training and self.gradient_checkpointing:
+    # Copied from diffusers.models.unet_1d_blocks.UpBlock1D._run_resnets
+    def _run_resnets(
+        self,
+        hidden_states: torch.FloatTensor,
+        res_hidden_states_tuple: Tuple[torch.FloatTensor, ...],
+        temb: Optional[torch.FloatTensor],
+        scale: float,
+        concat_fn: Callable = _cat_channels,
+    ) -> torch.FloatTensor:
+        resnet_forward = self._get_resnet_forward()
+        for resnet, res_hidden_states in zip(self.resnets, reversed(res_hidden_states_tuple)):
+            hidden_states = resnet_forward(resnet, concat_fn(hidden_states, res_hidden_states), temb, scale)
 
-                def create_custom_forward(module):
-                    def custom_forward(*inputs):
-                        return module(*inputs)
+        return hidden_states
 
-                    return custom_forward
+    def forward(self, hidden_states, res_hidden_states_tuple, temb=None, upsample_size=None, scale: float = 1.0):
+        _check_num_res_hidden_states(res_hidden_states_tuple, len(self.resnets))
 
-                if is_torch_version(">=", "1.11.0"):
-                    hidden_states = torch.utils.checkpoint.checkpoint(
-                        create_custom_forward(resnet), hidden_states, temb, use_reentrant=False
-                    )
-                else:
-                    hidden_states = torch.utils.checkpoint.checkpoint(
-                        create_custom_forward(resnet), hidden_states, temb
-                    )
-            else:
-                hidden_states = resnet(hidden_states, temb, scale=scale)
+        hidden_states = self._run_resnets(hidden_states, res_hidden_states_tuple, temb, scale, self._get_concat_fn())
 
         if self.upsamplers is not None:
             for upsampler in self.upsamplers:
@@ -1010,6 +1289,40 @@ OutBlockType = Union[OutConv1DBlock, OutValueFunctionBlock]
 UpBlockType = Union[UpResnetBlock1D, UpBlock1D, AttnUpBlock1D, UpBlock1DNoSkip]
 
 
+_DOWN_BLOCKS = {
+    "DownResnetBlock1D": DownResnetBlock1D,
+    "DownBlock1D": DownBlock1D,
+    "AttnDownBlock1D": AttnDownBlock1D,
+    "DownBlock1DNoSkip": DownBlock1DNoSkip,
+}
+_MID_BLOCKS = {
+    "MidResTemporalBlock1D": MidResTemporalBlock1D,
+    "ValueFunctionMidBlock1D": ValueFunctionMidBlock1D,
+    "UNetMidBlock1D": UNetMidBlock1D,
+}
+_OUT_BLOCKS = {
+    "OutConv1DBlock": OutConv1DBlock,
+    "ValueFunction": OutValueFunctionBlock,
+}
+_UP_BLOCKS = {
+    "UpResnetBlock1D": UpResnetBlock1D,
+    "UpBlock1D": UpBlock1D,
+    "AttnUpBlock1D": AttnUpBlock1D,
+    "UpBlock1DNoSkip": UpBlock1DNoSkip,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _init_parameter_names(block_class: type) -> FrozenSet[str]:
+    return frozenset(inspect.signature(block_class).parameters)
+
+
+def _build_block(block_class: type, **kwargs) -> nn.Module:
+    """Instantiates `block_class` with the subset of `kwargs` that its `__init__` accepts."""
+    parameter_names = _init_parameter_names(block_class)
+    return block_class(**{name: value for name, value in kwargs.items() if name in parameter_names})
+
+
 def get_down_block(
     down_block_type: str,
     num_layers: int,
@@ -1036,51 +1349,35 @@ def get_down_block(
     attention_head_dim: Optional[int] = None,
     downsample_type: Optional[str] = None,
     dropout: float = 0.0,
+    gelu_approximate: str = "none",
 ) -> DownBlockType:
-    if down_block_type == "DownResnetBlock1D":
-        return DownResnetBlock1D(
-            in_channels=in_channels,
-            num_layers=num_layers,
-            out_channels=out_channels,
-            temb_channels=temb_channels,
-            add_downsample=add_downsample,
-        )
-    elif down_block_type == "DownBlock1D":
-        return DownBlock1D(
-            num_layers=num_layers,
-            in_channels=in_channels,
-            out_channels=out_channels,
-            temb_channels=temb_channels,
-            dropout=dropout,
-            add_downsample=add_downsample,
-            resnet_eps=resnet_eps,
-            resnet_act_fn=resnet_act_fn,
-            resnet_groups=resnet_groups,
-            downsample_padding=downsample_padding,
-            resnet_time_scale_shift=resnet_time_scale_shift,
-        )
-    elif down_block_type == "AttnDownBlock1D":
-        if add_downsample is False:
-            downsample_type = None
-        else:
-            downsample_type = downsample_type or "conv"  # default to 'conv'
-        return AttnDownBlock1D(
-            num_layers=num_layers,
-            in_channels=in_channels,
-            out_channels=out_channels,
-            temb_channels=temb_channels,
-            dropout=dropout,
-            resnet_eps=resnet_eps,
-            resnet_act_fn=resnet_act_fn,
-            resnet_groups=resnet_groups,
-            downsample_padding=downsample_padding,
-            attention_head_dim=attention_head_dim,
-            resnet_time_scale_shift=resnet_time_scale_shift,
-            downsample_type=downsample_type,
-        )
-    elif down_block_type == "DownBlock1DNoSkip":
-        return DownBlock1DNoSkip(out_channels=out_channels, in_channels=in_channels)
-    raise ValueError(f"{down_block_type} does not exist.")
+    block_class = _DOWN_BLOCKS.get(down_block_type)
+    if block_class is None:
+        raise ValueError(f"{down_block_type} does not exist.")
+
+    # blocks that take a `downsample_type` are configured through it rather than through `add_downsample`
+    if add_downsample is False:
+        downsample_type = None
+    else:
+        downsample_type = downsample_type or "conv"  # default to 'conv'
+
+    return _build_block(
+        block_class,
+        num_layers=num_layers,
+        in_channels=in_channels,
+        out_channels=out_channels,
+        temb_channels=temb_channels,
+        dropout=dropout,
+        add_downsample=add_downsample,
+        resnet_eps=resnet_eps,
+        resnet_act_fn=resnet_act_fn,
+        resnet_groups=resnet_groups,
+        downsample_padding=downsample_padding,
+        attention_head_dim=attention_head_dim,
+        resnet_time_scale_shift=resnet_time_scale_shift,
+        downsample_type=downsample_type,
+        gelu_approximate=gelu_approximate,
+    )
 
 
 def get_up_block(
@@ -1118,63 +1415,33 @@ def get_up_block(
         )
         attention_head_dim = num_attention_heads
 
-    if up_block_type == "UpResnetBlock1D":
-        return UpResnetBlock1D(
-            in_channels=in_channels,
-            num_layers=num_layers,
-            out_channels=out_channels,
-            temb_channels=temb_channels,
-            add_upsample=add_upsample,
-        )
-    elif up_block_type == "UpBlock1D":
-        return UpBlock1D(
-            num_layers=num_layers,
-            in_channels=in_channels,
-            skip_channels=skip_channels,
-            out_channels=out_channels,
-            temb_channels=temb_channels,
-            resolution_idx=resolution_idx,
-            dropout=dropout,
-            add_upsample=add_upsample,
-            resnet_eps=resnet_eps,
-            resnet_act_fn=resnet_act_fn,
-            resnet_groups=resnet_groups,
-            resnet_time_scale_shift=resnet_time_scale_shift,
-        )
-    elif up_block_type == "AttnUpBlock1D":
-        if add_upsample is False:
-            upsample_type = None
-        else:
-            upsample_type = upsample_type or "conv"  # default to 'conv'
-        return AttnUpBlock1D(
-            num_layers=num_layers,
-            in_channels=in_channels,
-            skip_channels=skip_channels,
-            out_channels=out_channels,
-            temb_channels=temb_channels,
-            resolution_idx=resolution_idx,
-            dropout=dropout,
-            resnet_eps=resnet_eps,
-            resnet_act_fn=resnet_act_fn,
-            resnet_groups=resnet_groups,
-            attention_head_dim=attention_head_dim,
-            resnet_time_scale_shift=resnet_time_scale_shift,
-            upsample_type=upsample_type,
-        )
-    elif up_block_type == "UpBlock1DNoSkip":
-        return UpBlock1DNoSkip(
-            num_layers=num_layers,
-            in_channels=in_channels,
-            skip_channels=skip_channels,
-            out_channels=out_channels,
-            resolution_idx=resolution_idx,
-            dropout=dropout,
-            add_upsample=add_upsample,
-            resnet_eps=resnet_eps,
-            resnet_act_fn=resnet_act_fn,
-            resnet_groups=resnet_groups,
-        )
-    raise ValueError(f"{up_block_type} does not exist.")
+    block_class = _UP_BLOCKS.get(up_block_type)
+    if block_class is None:
+        raise ValueError(f"{up_block_type} does not exist.")
+
+    # blocks that take an `upsample_type` are configured through it rather than through `add_upsample`
+    if add_upsample is False:
+        upsample_type = None
+    else:
+        upsample_type = upsample_type or "conv"  # default to 'conv'
+
+    return _build_block(
+        block_class,
+        num_layers=num_layers,
+        in_channels=in_channels,
+        skip_channels=skip_channels,
+        out_channels=out_channels,
+        temb_channels=temb_channels,
+        resolution_idx=resolution_idx,
+        dropout=dropout,
+        add_upsample=add_upsample,
+        resnet_eps=resnet_eps,
+        resnet_act_fn=resnet_act_fn,
+        resnet_groups=resnet_groups,
+        attention_head_dim=attention_head_dim,
+        resnet_time_scale_shift=resnet_time_scale_shift,
+        upsample_type=upsample_type,
+    )
 
 
 def get_mid_block(
@@ -1194,31 +1461,34 @@ def get_mid_block(
     resnet_time_scale_shift: str = "default",
     add_attention: bool = True,
 ) -> MidBlockType:
-    if mid_block_type == "MidResTemporalBlock1D":
-        return MidResTemporalBlock1D(
-            num_layers=num_layers,
-            in_channels=in_channels,
-            out_channels=out_channels,
-            embed_dim=embed_dim,
-            add_downsample=add_downsample,
-        )
-    elif mid_block_type == "ValueFunctionMidBlock1D":
-        return ValueFunctionMidBlock1D(in_channels=in_channels, out_channels=out_channels, embed_dim=embed_dim)
-    elif mid_block_type == "UNetMidBlock1D":
-        return UNetMidBlock1D(
-            in_channels=in_channels,
-            temb_channels=embed_dim,
-            dropout=dropout,
-            resnet_eps=norm_eps,
-            resnet_act_fn=act_fn,
-            output_scale_factor=mid_block_scale_factor,
-            resnet_time_scale_shift=resnet_time_scale_shift,
-            attention_head_dim=attention_head_dim,
-            resnet_groups=norm_num_groups,
-            attn_groups=attn_norm_num_groups,
-            add_attention=add_attention,
-        )
-    raise ValueError(f"{mid_block_type} does not exist.")
+    block_class = _MID_BLOCKS.get(mid_block_type)
+    if block_class is None:
+        raise ValueError(f"{mid_block_type} does not exist.")
+
+    # the mid blocks name their shared arguments differently, so each value is passed under every name in use
+    block_kwargs = {
+        "num_layers": num_layers,
+        "in_channels": in_channels,
+        "out_channels": out_channels,
+        "embed_dim": embed_dim,
+        "temb_channels": embed_dim,
+        "add_downsample": add_downsample,
+        "dropout": dropout,
+        "resnet_eps": norm_eps,
+        "resnet_act_fn": act_fn,
+        "output_scale_factor": mid_block_scale_factor,
+        "resnet_time_scale_shift": resnet_time_scale_shift,
+        "attention_head_dim": attention_head_dim,
+        "resnet_groups": norm_num_groups,
+        "attn_groups": attn_norm_num_groups,
+        "add_attention": add_attention,
+    }
+    if block_class is UNetMidBlock1D:
+        # `UNetMidBlock1D` has always been built with its default number of layers, passing `num_layers` through
+        # would change the architecture of existing checkpoints
+        del block_kwargs["num_layers"]
+
+    return _build_block(block_class, **block_kwargs)
 
 
 def get_out_block(
@@ -1231,14 +1501,16 @@ def get_out_block(
     act_fn: str,
     fc_dim: int,
 ) -> Optional[OutBlockType]:
-    if out_block_type == "OutConv1DBlock":
-        return OutConv1DBlock(
-            in_channels=in_channels,
-            out_channels=out_channels,
-            num_groups_out=num_groups_out,
-            embed_dim=embed_dim,
-            act_fn=act_fn,
-        )
-    elif out_block_type == "ValueFunction":
-        return OutValueFunctionBlock(fc_dim, embed_dim, act_fn)
-    return None
+    block_class = _OUT_BLOCKS.get(out_block_type)
+    if block_class is None:
+        return None
+
+    return _build_block(
+        block_class,
+        in_channels=in_channels,
+        out_channels=out_channels,
+        num_groups_out=num_groups_out,
+        embed_dim=embed_dim,
+        act_fn=act_fn,
+        fc_dim=fc_dim,
+    )
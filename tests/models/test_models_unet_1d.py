@@ -13,17 +13,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import math
+import pickle
 import unittest
 
 import torch
+import torch.nn.functional as F
 
 from diffusers import UNet1DModel
+from diffusers.models.lora import LoRACompatibleLinear, LoRALinearLayer
+from diffusers.models.unet_1d_blocks import (
+    MidResTemporalBlock1D,
+    ResConvBlock,
+    SelfAttention1d,
+    UpBlock1D,
+    _cat_channels_freeu,
+    get_down_block,
+)
+from diffusers.utils import is_torch_version
 from diffusers.utils.testing_utils import (
     backend_manual_seed,
     floats_tensor,
+    require_torch_2,
+    require_torch_gpu,
     slow,
     torch_device,
 )
+from diffusers.utils.torch_utils import apply_freeu
 
 from .test_modeling_common import ModelTesterMixin, UNetTesterMixin
 
@@ -268,3 +285,389 @@ class UNetRLModelTests(ModelTesterMixin, UNetTesterMixin, unittest.TestCase):
     def test_forward_with_norm_groups(self):
         # Not implemented yet for this UNet
         pass
+
+
+class UNet1DResnetBlockModelTests(unittest.TestCase):
+    def get_dummy_model(self):
+        torch.manual_seed(0)
+        model = UNet1DModel(
+            in_channels=14,
+            out_channels=14,
+            block_out_channels=(32, 64),
+            down_block_types=("DownBlock1D", "DownBlock1D"),
+            up_block_types=("UpBlock1D", "UpBlock1D"),
+            mid_block_type="UNetMidBlock1D",
+            time_embedding_type="positional",
+            use_timestep_embedding=True,
+            attention_head_dim=8,
+        )
+        return model.to(torch_device).eval()
+
+    def get_dummy_inputs(self):
+        noise = floats_tensor((4, 14, 16)).to(torch_device)
+        time_step = torch.tensor([10] * 4).to(torch_device)
+        return {"sample": noise, "timestep": time_step}
+
+    def test_fused_qkv_projections(self):
+        model = self.get_dummy_model()
+        inputs = self.get_dummy_inputs()
+
+        with torch.no_grad():
+            original_output = model(**inputs).sample
+
+            model.fuse_qkv_projections()
+            fused_output = model(**inputs).sample
+
+            model.unfuse_qkv_projections()
+            disabled_output = model(**inputs).sample
+
+        assert torch.allclose(
+            original_output, fused_output, atol=1e-4
+        ), "Fusion of QKV projections shouldn't affect the outputs."
+        assert torch.allclose(
+            original_output, disabled_output, atol=1e-4
+        ), "Original outputs should match when fused QKV projections are disabled."
+
+    def test_mixed_precision(self):
+        model = self.get_dummy_model()
+        inputs = self.get_dummy_inputs()
+
+        with torch.no_grad():
+            original_output = model(**inputs).sample
+
+            model.enable_mixed_precision(torch.bfloat16)
+            mixed_output = model(**inputs).sample
+
+        self.assertEqual(model.conv_in.weight.dtype, torch.float32)
+        self.assertEqual(model.mid_block.resnets[0].conv1.weight.dtype, torch.bfloat16)
+        self.assertEqual(mixed_output.dtype, original_output.dtype)
+        self.assertTrue(torch.allclose(original_output, mixed_output, atol=5e-2))
+
+    @unittest.skipIf(is_torch_version("<", "2.2.0"), "`compile_blocks` requires PyTorch 2.2.")
+    def test_compile_blocks(self):
+        model = self.get_dummy_model()
+        inputs = self.get_dummy_inputs()
+
+        with torch.no_grad():
+            original_output = model(**inputs).sample
+
+            model.compile_blocks(backend="eager", fullgraph=True)
+            compiled_output = model(**inputs).sample
+
+        self.assertTrue(torch.allclose(original_output, compiled_output, atol=1e-5))
+
+    @unittest.skipIf(torch_device != "cpu", "Dynamically quantized linear layers only run on CPU.")
+    def test_quantize_attention_projections(self):
+        model = self.get_dummy_model()
+        inputs = self.get_dummy_inputs()
+
+        with torch.no_grad():
+            original_output = model(**inputs).sample
+
+            model.quantize_attention_projections()
+            quantized_output = model(**inputs).sample
+
+        self.assertNotIsInstance(model.mid_block.attentions[0].query, torch.nn.Linear)
+        self.assertEqual(quantized_output.shape, original_output.shape)
+        self.assertTrue(torch.allclose(original_output, quantized_output, atol=2e-2))
+
+        # the quantized projections have no float weights left to fuse
+        with self.assertRaises(ValueError):
+            model.fuse_qkv_projections()
+
+
+class MidResTemporalBlock1DTests(unittest.TestCase):
+    def test_downsample_is_applied_to_hidden_states(self):
+        block = MidResTemporalBlock1D(in_channels=16, out_channels=16, embed_dim=32, add_downsample=True)
+        block.to(torch_device).eval()
+
+        hidden_states = floats_tensor((2, 16, 8)).to(torch_device)
+        temb = floats_tensor((2, 32)).to(torch_device)
+
+        with torch.no_grad():
+            output = block(hidden_states, temb)
+            # a second call must still go through the downsample module
+            second_output = block(hidden_states, temb)
+
+        self.assertIsInstance(block.downsample, torch.nn.Module)
+        self.assertEqual(output.shape, (2, 16, 4))
+        self.assertTrue(torch.allclose(output, second_output))
+
+
+class ResConvBlockTests(unittest.TestCase):
+    def get_reference_output(self, block, hidden_states, approximate):
+        residual = block.conv_skip(hidden_states) if block.has_conv_skip else hidden_states
+        output = F.gelu(block.group_norm_1(block.conv_1(hidden_states)), approximate=approximate)
+        output = F.gelu(block.group_norm_2(block.conv_2(output)), approximate=approximate)
+        return output + residual
+
+    def test_gelu_approximate(self):
+        torch.manual_seed(0)
+        block = ResConvBlock(in_channels=8, mid_channels=16, out_channels=8).to(torch_device).eval()
+        hidden_states = floats_tensor((2, 8, 16)).to(torch_device)
+
+        with torch.no_grad():
+            output = block(hidden_states)
+            expected_output = self.get_reference_output(block, hidden_states, approximate="none")
+            self.assertTrue(torch.allclose(output, expected_output, atol=1e-6))
+
+            tanh_block = ResConvBlock(in_channels=8, mid_channels=16, out_channels=8, gelu_approximate="tanh")
+            tanh_block.load_state_dict(block.state_dict())
+            tanh_block.to(torch_device).eval()
+
+            output = tanh_block(hidden_states)
+            expected_output = self.get_reference_output(tanh_block, hidden_states, approximate="tanh")
+            self.assertTrue(torch.allclose(output, expected_output, atol=1e-6))
+
+    def test_gelu_approximate_is_passed_by_get_down_block(self):
+        block = get_down_block(
+            "DownBlock1DNoSkip",
+            num_layers=1,
+            in_channels=8,
+            out_channels=16,
+            temb_channels=8,
+            add_downsample=False,
+            resnet_eps=1e-5,
+            resnet_act_fn="gelu",
+            gelu_approximate="tanh",
+        )
+
+        for resnet in block.resnets:
+            self.assertEqual(resnet.gelu_1.approximate, "tanh")
+
+
+class SelfAttention1dTests(unittest.TestCase):
+    def get_reference_output(self, attention, hidden_states):
+        # the original formulation on the (B, T, C) layout with an explicit matmul and softmax
+        batch, channel_dim, seq = hidden_states.shape
+        head_dim = channel_dim // attention.num_heads
+
+        normed_states = attention.group_norm(hidden_states).transpose(1, 2)
+        query_states, key_states, value_states = (
+            linear(normed_states).view(batch, seq, attention.num_heads, head_dim).permute(0, 2, 1, 3)
+            for linear in (attention.query, attention.key, attention.value)
+        )
+
+        scale = 1 / math.sqrt(math.sqrt(head_dim))
+        attention_scores = torch.matmul(query_states * scale, key_states.transpose(-1, -2) * scale)
+        attention_probs = torch.softmax(attention_scores, dim=-1)
+
+        output = torch.matmul(attention_probs, value_states).permute(0, 2, 1, 3).reshape(batch, seq, channel_dim)
+        output = attention.proj_attn(output).transpose(1, 2)
+        return output + hidden_states
+
+    def test_matches_reference_attention(self):
+        torch.manual_seed(0)
+        attention = SelfAttention1d(in_channels=8, n_head=2).to(torch_device).eval()
+        hidden_states = floats_tensor((2, 8, 16)).to(torch_device)
+
+        with torch.no_grad():
+            expected_output = self.get_reference_output(attention, hidden_states)
+            output = attention(hidden_states)
+
+            attention.fuse_projections()
+            fused_output = attention(hidden_states)
+
+        self.assertTrue(torch.allclose(output, expected_output, atol=1e-5))
+        self.assertTrue(torch.allclose(fused_output, expected_output, atol=1e-5))
+
+    def test_autocast_keeps_residual_dtype(self):
+        torch.manual_seed(0)
+        attention = SelfAttention1d(in_channels=8, n_head=2).to(torch_device).eval()
+        hidden_states = floats_tensor((2, 8, 16)).to(torch_device)
+
+        with torch.no_grad(), torch.autocast(torch.device(torch_device).type, dtype=torch.bfloat16):
+            output = attention(hidden_states)
+
+        # the residual stream must not be rounded down to the reduced precision of the projections
+        self.assertEqual(output.dtype, torch.float32)
+
+    def test_lora_projections_are_called_as_modules(self):
+        torch.manual_seed(0)
+        attention = SelfAttention1d(in_channels=8, n_head=2)
+        lora_query = LoRACompatibleLinear(8, 8, lora_layer=LoRALinearLayer(8, 8, rank=4))
+        lora_query.load_state_dict(attention.query.state_dict(), strict=False)
+        torch.nn.init.normal_(lora_query.lora_layer.up.weight)
+        attention.query = lora_query
+        attention.to(torch_device).eval()
+
+        hidden_states = floats_tensor((2, 8, 16)).to(torch_device)
+
+        with torch.no_grad():
+            output = attention.project_channels(attention.query, hidden_states)
+            expected_output = attention.query(hidden_states.transpose(1, 2)).transpose(1, 2)
+
+        # the LoRA update must not be skipped by the 1x1 conv fast path for plain linear layers
+        self.assertTrue(torch.allclose(output, expected_output, atol=1e-5))
+
+
+class UpBlock1DTests(unittest.TestCase):
+    def get_dummy_block(self, **kwargs):
+        init_kwargs = {"in_channels": 8, "skip_channels": 8, "out_channels": 8, "temb_channels": 16, "num_layers": 2}
+        init_kwargs.update(kwargs)
+        return UpBlock1D(**init_kwargs)
+
+    def get_dummy_inputs(self, device=torch_device):
+        hidden_states = floats_tensor((2, 8, 16)).to(device)
+        res_hidden_states_tuple = (floats_tensor((2, 8, 16)).to(device), floats_tensor((2, 8, 16)).to(device))
+        temb = floats_tensor((2, 16)).to(device)
+        return {"hidden_states": hidden_states, "res_hidden_states_tuple": res_hidden_states_tuple, "temb": temb}
+
+    def test_skip_states_are_cast_to_hidden_states_dtype(self):
+        block = self.get_dummy_block().to(torch_device, dtype=torch.bfloat16).eval()
+        inputs = self.get_dummy_inputs()
+        # skip states stay in full precision as kept by the down path
+        inputs["hidden_states"] = inputs["hidden_states"].to(torch.bfloat16)
+        inputs["temb"] = inputs["temb"].to(torch.bfloat16)
+
+        with torch.no_grad():
+            output = block(**inputs)
+
+        self.assertEqual(output.dtype, torch.bfloat16)
+        self.assertEqual(output.shape, (2, 8, 32))
+
+    def test_freeu(self):
+        block = self.get_dummy_block(resolution_idx=0).to(torch_device).eval()
+        inputs = self.get_dummy_inputs()
+        original_hidden_states = inputs["hidden_states"].clone()
+
+        with torch.no_grad():
+            output = block(**inputs)
+            block.s1, block.s2, block.b1, block.b2 = 0.9, 0.2, 1.2, 1.4
+            output_freeu = block(**inputs)
+
+        self.assertEqual(output_freeu.shape, output.shape)
+        self.assertFalse(torch.allclose(output, output_freeu))
+        # FreeU scales the backbone features on a copy, the caller's tensor stays unchanged
+        self.assertTrue(torch.equal(inputs["hidden_states"], original_hidden_states))
+
+    def test_freeu_matches_apply_freeu(self):
+        hidden_states = floats_tensor((2, 8, 16)).to(torch_device)
+        res_hidden_states = floats_tensor((2, 8, 16)).to(torch_device)
+        freeu_kwargs = {"s1": 0.9, "s2": 0.2, "b1": 1.2, "b2": 1.4}
+
+        for resolution_idx in (0, 1, 2):
+            output = _cat_channels_freeu(hidden_states, res_hidden_states, resolution_idx, **freeu_kwargs)
+
+            # the 1D sequence is filtered as a single row of the 2D filter
+            expected_hidden_states, expected_res_hidden_states = apply_freeu(
+                resolution_idx, hidden_states.clone().unsqueeze(2), res_hidden_states.unsqueeze(2), **freeu_kwargs
+            )
+            expected_output = torch.cat([expected_hidden_states, expected_res_hidden_states], dim=1).squeeze(2)
+
+            self.assertTrue(torch.equal(output, expected_output))
+
+    def test_checkpoint_granularity(self):
+        block = self.get_dummy_block().to(torch_device).train()
+        inputs = self.get_dummy_inputs()
+
+        def get_grads():
+            block.zero_grad()
+            block(**inputs).mean().backward()
+            return [param.grad.clone() for param in block.parameters()]
+
+        expected_grads = get_grads()
+
+        block.gradient_checkpointing = True
+        for granularity in ("block", "norm_conv"):
+            block.checkpoint_granularity = granularity
+            for grad, expected_grad in zip(get_grads(), expected_grads):
+                self.assertTrue(torch.allclose(grad, expected_grad, atol=1e-6))
+
+    @require_torch_2
+    def test_compile_resnets(self):
+        block = self.get_dummy_block().to(torch_device).eval()
+        inputs = self.get_dummy_inputs()
+
+        with torch.no_grad():
+            expected_output = block(**inputs)
+
+            block.compile_resnets(backend="eager", fullgraph=True)
+            output = block(**inputs)
+
+        self.assertTrue(torch.allclose(output, expected_output, atol=1e-5))
+
+    @require_torch_2
+    def test_compiled_resnets_are_copied(self):
+        block = self.get_dummy_block().to(torch_device).eval()
+        block.compile_resnets(backend="eager")
+        inputs = self.get_dummy_inputs()
+
+        for copied_block in (copy.deepcopy(block), pickle.loads(pickle.dumps(block))):
+            with torch.no_grad():
+                for param in copied_block.parameters():
+                    param.mul_(2)
+
+                eager_block = self.get_dummy_block().to(torch_device).eval()
+                eager_block.load_state_dict(copied_block.state_dict())
+                expected_output = eager_block(**inputs)
+                output = copied_block(**inputs)
+
+            # the compiled loop of the copy must run the resnets of the copy, not the ones of the original block
+            self.assertIsNotNone(copied_block._compiled_run_resnets)
+            self.assertTrue(torch.allclose(output, expected_output, atol=1e-5))
+
+    @require_torch_gpu
+    def test_cuda_graphs(self):
+        block = self.get_dummy_block().to("cuda").eval()
+        inputs = self.get_dummy_inputs(device="cuda")
+
+        with torch.no_grad():
+            expected_output = block(**inputs)
+
+            block.enable_cuda_graphs()
+            # the first call captures the graph, the second one replays it with new inputs
+            block(**{**inputs, "hidden_states": inputs["hidden_states"] * 2})
+            output = block(**inputs)
+
+            # moving the block off the GPU and back reallocates its weights, as done by model CPU offloading
+            block.cpu().to("cuda")
+            output_after_offload = block(**inputs)
+
+            block.disable_cuda_graphs()
+
+        self.assertTrue(torch.allclose(output, expected_output, atol=1e-5))
+        self.assertTrue(torch.allclose(output_after_offload, expected_output, atol=1e-5))
+
+    def test_moving_the_block_releases_the_cuda_graph(self):
+        block = self.get_dummy_block()
+        block.enable_cuda_graphs()
+        block._cuda_graph_state = {"key": None}
+
+        block.to(torch_device)
+
+        self.assertIsNone(block._cuda_graph_state)
+
+    def test_mismatched_skip_states_raise(self):
+        block = self.get_dummy_block().to(torch_device).eval()
+        inputs = self.get_dummy_inputs()
+
+        # skip states that would broadcast against the hidden states must fail like `torch.cat` does
+        for shape in ((2, 8, 1), (1, 8, 16)):
+            inputs["res_hidden_states_tuple"] = (
+                floats_tensor(shape).to(torch_device),
+                floats_tensor(shape).to(torch_device),
+            )
+            with self.assertRaises(RuntimeError), torch.no_grad():
+                block(**inputs)
+
+    def test_too_few_skip_states_raise(self):
+        block = self.get_dummy_block().to(torch_device).eval()
+        inputs = self.get_dummy_inputs()
+        inputs["res_hidden_states_tuple"] = inputs["res_hidden_states_tuple"][:1]
+
+        with self.assertRaises(ValueError), torch.no_grad():
+            block(**inputs)
+
+    def test_cuda_graphs_and_compiled_resnets_are_exclusive(self):
+        block = self.get_dummy_block()
+
+        block.compile_resnets(backend="eager")
+        with self.assertRaises(ValueError):
+            block.enable_cuda_graphs()
+
+        block = self.get_dummy_block()
+
+        block.enable_cuda_graphs()
+        with self.assertRaises(ValueError):
+            block.compile_resnets(backend="eager")